@@ -2,11 +2,13 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from flask_caching import Cache
 from config import Config
 
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
+cache = Cache()
 
 
 def create_app(config_class=Config):
@@ -17,13 +19,15 @@ def create_app(config_class=Config):
     migrate.init_app(app, db)
     login_manager.init_app(app)
     login_manager.login_view = "main.login"  # redirect here if not logged in
+    cache.init_app(app)
 
     from app import models
     from app.models import User
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Session.get() checks the identity map before emitting SQL
+        return db.session.get(User, int(user_id))
 
     from app.routes import main_bp
     app.register_blueprint(main_bp)
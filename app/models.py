@@ -9,13 +9,24 @@ from flask_login import UserMixin
 # ==========================================================
 
 class User(UserMixin, db.Model):
+    __table_args__ = (
+        # Partial index: only the (few) admin rows are indexed
+        db.Index(
+            "ix_user_is_admin",
+            "is_admin",
+            postgresql_where=db.text("is_admin"),
+            sqlite_where=db.text("is_admin"),
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
+    # unique=True already gives the login lookup its index
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     name = db.Column(db.String(100), nullable=False)
+    is_admin = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
-    notifications = db.relationship("Notification", backref="user", lazy=True)
+    notifications = db.relationship("Notification", back_populates="user", lazy="raise")
 
     def __repr__(self):
         return f"<User {self.email}>"
@@ -26,8 +37,8 @@ class OwnerGroup(db.Model):
     group_name = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    users = db.relationship("OwnerGroupUser", backref="group", lazy=True)
-    vehicles = db.relationship("Vehicle", backref="group", lazy=True)
+    users = db.relationship("OwnerGroupUser", back_populates="group", lazy="raise")
+    vehicles = db.relationship("Vehicle", back_populates="group", lazy="raise")
 
     def __repr__(self):
         return f"<OwnerGroup {self.group_name}>"
@@ -41,6 +52,8 @@ class OwnerGroupUser(db.Model):
     role_in_group = db.Column(db.String(20), default="member")
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    group = db.relationship("OwnerGroup", back_populates="users")
+
 
 # ==========================================================
 # VEHICLE
@@ -60,14 +73,18 @@ class Vehicle(db.Model):
     current_odometer = db.Column(db.Integer, default=0)
 
     # Relationships
-    service_events = db.relationship("ServiceEvent", backref="vehicle", lazy=True)
-    fuel_entries = db.relationship("FuelEntry", backref="vehicle", lazy=True)
-    expenses = db.relationship("Expense", backref="vehicle", lazy=True)
-    issues = db.relationship("IssueLog", backref="vehicle", lazy=True)
-    odometer_logs = db.relationship("OdometerLog", backref="vehicle", lazy=True)
-    forecasts = db.relationship("MaintenanceForecast", backref="vehicle", lazy=True)
-    health_scores = db.relationship("HealthScore", backref="vehicle", lazy=True)
-    reminders = db.relationship("Reminder", backref="vehicle", lazy=True)
+    # Collections are lazy="raise": load them explicitly (selectinload etc.)
+    # so a loop over vehicles can't silently issue one query per row.
+    group = db.relationship("OwnerGroup", back_populates="vehicles")
+
+    service_events = db.relationship("ServiceEvent", back_populates="vehicle", lazy="raise")
+    fuel_entries = db.relationship("FuelEntry", back_populates="vehicle", lazy="raise")
+    expenses = db.relationship("Expense", back_populates="vehicle", lazy="raise")
+    issues = db.relationship("IssueLog", back_populates="vehicle", lazy="raise")
+    odometer_logs = db.relationship("OdometerLog", back_populates="vehicle", lazy="raise")
+    forecasts = db.relationship("MaintenanceForecast", back_populates="vehicle", lazy="raise")
+    health_scores = db.relationship("HealthScore", back_populates="vehicle", lazy="raise")
+    reminders = db.relationship("Reminder", back_populates="vehicle", lazy="raise")
 
     def __repr__(self):
         return f"<Vehicle {self.brand} {self.model}>"
@@ -78,6 +95,22 @@ class Vehicle(db.Model):
 # ==========================================================
 
 class ServiceEvent(db.Model):
+    __table_args__ = (
+        # Per-vehicle history, newest first
+        db.Index("ix_svc_veh_date", "vehicle_id", "service_date"),
+        # Serves the last_per_type CTE in load_vehicle_summary, which seeks
+        # (vehicle_id, service_type IN ...) and ranks by service_date; that
+        # CTE also reads odometer_at_service, so on Postgres it is INCLUDEd
+        # to keep the scan index-only
+        db.Index(
+            "ix_svc_veh_type_date",
+            "vehicle_id",
+            "service_type",
+            "service_date",
+            postgresql_include=["odometer_at_service"],
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id"), nullable=False)
 
@@ -90,7 +123,8 @@ class ServiceEvent(db.Model):
     labor_cost = db.Column(db.Float, default=0)
     total_cost = db.Column(db.Float, default=0)
 
-    parts_used = db.relationship("ServicePartUsage", backref="service", lazy=True)
+    vehicle = db.relationship("Vehicle", back_populates="service_events")
+    parts_used = db.relationship("ServicePartUsage", back_populates="service", lazy="raise")
 
 
 class Part(db.Model):
@@ -99,7 +133,7 @@ class Part(db.Model):
     category = db.Column(db.String(50))
     brand = db.Column(db.String(50))
 
-    used_in = db.relationship("ServicePartUsage", backref="part", lazy=True)
+    used_in = db.relationship("ServicePartUsage", back_populates="part", lazy="raise")
 
 
 class ServicePartUsage(db.Model):
@@ -113,12 +147,19 @@ class ServicePartUsage(db.Model):
     line_cost = db.Column(db.Float)
     warranty_months = db.Column(db.Integer, default=0)
 
+    service = db.relationship("ServiceEvent", back_populates="parts_used")
+    part = db.relationship("Part", back_populates="used_in")
+
 
 # ==========================================================
 # FUEL
 # ==========================================================
 
 class FuelEntry(db.Model):
+    __table_args__ = (
+        db.Index("ix_fuel_veh_date", "vehicle_id", "date"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id"), nullable=False)
 
@@ -133,12 +174,18 @@ class FuelEntry(db.Model):
     fuel_type = db.Column(db.String(50))
     station_name = db.Column(db.String(100))
 
+    vehicle = db.relationship("Vehicle", back_populates="fuel_entries")
+
 
 # ==========================================================
 # EXPENSES
 # ==========================================================
 
 class Expense(db.Model):
+    __table_args__ = (
+        db.Index("ix_expense_veh_date", "vehicle_id", "date"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id"), nullable=False)
 
@@ -147,12 +194,18 @@ class Expense(db.Model):
     amount = db.Column(db.Float)
     description = db.Column(db.Text)
 
+    vehicle = db.relationship("Vehicle", back_populates="expenses")
+
 
 # ==========================================================
 # ISSUE LOGS
 # ==========================================================
 
 class IssueLog(db.Model):
+    __table_args__ = (
+        db.Index("ix_issue_veh_date", "vehicle_id", "date_reported"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id"), nullable=False)
 
@@ -162,12 +215,18 @@ class IssueLog(db.Model):
     category = db.Column(db.String(50))
     status = db.Column(db.String(20), default="open")
 
+    vehicle = db.relationship("Vehicle", back_populates="issues")
+
 
 # ==========================================================
 # ODOMETER LOGS
 # ==========================================================
 
 class OdometerLog(db.Model):
+    __table_args__ = (
+        db.Index("ix_odo_veh_date", "vehicle_id", "log_date"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id"), nullable=False)
 
@@ -175,6 +234,31 @@ class OdometerLog(db.Model):
     log_date = db.Column(db.DateTime, default=datetime.utcnow)
     source = db.Column(db.String(50))  # manual / fuel / service
 
+    vehicle = db.relationship("Vehicle", back_populates="odometer_logs")
+
+
+# ==========================================================
+# PRE-AGGREGATED METRICS
+# ==========================================================
+
+class VehicleMetricsCache(db.Model):
+    """
+    Running totals per vehicle, bumped by add_service / add_fuel so the
+    detail page reads one row instead of aggregating the full history.
+    """
+    vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id"), primary_key=True)
+
+    service_count = db.Column(db.Integer, nullable=False, default=0)
+    total_service_expense = db.Column(db.Float, nullable=False, default=0)
+
+    total_fuel_cost = db.Column(db.Float, nullable=False, default=0)
+    total_liters = db.Column(db.Float, nullable=False, default=0)
+    fuel_count = db.Column(db.Integer, nullable=False, default=0)
+    min_odo = db.Column(db.Integer)  # lowest fuel_entry odometer
+    max_odo = db.Column(db.Integer)  # highest fuel_entry odometer
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 # ==========================================================
 # PREDICTIVE MAINTENANCE
@@ -189,6 +273,8 @@ class MaintenanceForecast(db.Model):
     predicted_due_odometer = db.Column(db.Integer)
     last_calculated = db.Column(db.DateTime, default=datetime.utcnow)
 
+    vehicle = db.relationship("Vehicle", back_populates="forecasts")
+
 
 # ==========================================================
 # HEALTH SCORE
@@ -202,6 +288,8 @@ class HealthScore(db.Model):
     calculated_at = db.Column(db.DateTime, default=datetime.utcnow)
     explanation_text = db.Column(db.Text)
 
+    vehicle = db.relationship("Vehicle", back_populates="health_scores")
+
 
 # ==========================================================
 # REMINDERS + NOTIFICATIONS
@@ -217,6 +305,8 @@ class Reminder(db.Model):
     due_odometer = db.Column(db.Integer)
     is_completed = db.Column(db.Boolean, default=False)
 
+    vehicle = db.relationship("Vehicle", back_populates="reminders")
+
 
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -225,3 +315,5 @@ class Notification(db.Model):
     message = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)
+
+    user = db.relationship("User", back_populates="notifications")
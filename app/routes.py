@@ -1,14 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+from flask import Blueprint, abort, current_app, g, render_template, request, redirect, url_for
 from flask_login import (
     login_user,
     logout_user,
     login_required,
     current_user,
 )
+from flask_caching.backends import NullCache, SimpleCache
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import text
+from sqlalchemy import and_, bindparam, case, func, insert, literal, or_, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload
 
-from app import db
+from app import cache, db
 from app.models import (
     User,
     OwnerGroup,
@@ -19,24 +22,180 @@ from app.models import (
     Expense,
     IssueLog,
     OdometerLog,
+    VehicleMetricsCache,
 )
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import random
+import re
+import uuid
 main_bp = Blueprint("main", __name__)
 
+# Cheap shape check run before any DB lookup on login. Kept as loose as
+# register / the type="email" input (e.g. "bo@localhost" is valid), so no
+# account that can be registered is rejected here.
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+$")
+
+# Hot lookups built once at import time. Values are passed as bind
+# parameters, so every request reuses the same cached compiled SQL.
+USER_BY_EMAIL_STMT = select(User).where(User.email == bindparam("email"))
+LINK_BY_USER_STMT = (
+    select(OwnerGroupUser)
+    .where(OwnerGroupUser.user_id == bindparam("uid"))
+    .limit(1)
+)
+
+
+# Keyset pagination for the list pages
+PAGE_SIZE = 40
+MAX_PAGE_SIZE = 100
+
+
+def _page_size() -> int:
+    return max(1, min(request.args.get("limit", PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+
+def keyset_page_by_date(query, date_col, id_col):
+    """
+    Return one page of `query`, newest first, plus the cursor for the next
+    page (None on the last page).
+
+    The cursor is "<iso-date>_<id>" of the last row shown; the id breaks
+    ties between rows on the same date so none are skipped or repeated.
+    """
+    limit = _page_size()
+
+    raw_cursor = request.args.get("cursor")
+    if raw_cursor:
+        try:
+            raw_date, _, raw_id = raw_cursor.partition("_")
+            cursor_date = datetime.strptime(raw_date, "%Y-%m-%d").date()
+            cursor_id = int(raw_id)
+        except ValueError:
+            abort(400)
+        query = query.filter(or_(
+            date_col < cursor_date,
+            and_(date_col == cursor_date, id_col < cursor_id),
+        ))
+
+    # Fetch one extra row to know whether there is a next page
+    rows = query.order_by(date_col.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    last_date = getattr(last, date_col.key)
+    return rows, f"{last_date.isoformat()}_{getattr(last, id_col.key)}"
+
+
+def hash_password(password: str) -> str:
+    return generate_password_hash(
+        password,
+        method=current_app.config["PASSWORD_HASH_METHOD"],
+        salt_length=16,
+    )
+
+
+def _hash_algorithm_and_cost(method: str):
+    # "pbkdf2:sha256:600000" -> ("pbkdf2:sha256", (600000,))
+    # "scrypt:32768:8:1"     -> ("scrypt", (32768, 8, 1))
+    parts = method.split(":")
+    algorithm = ":".join(part for part in parts if not part.isdigit())
+    cost = tuple(int(part) for part in parts if part.isdigit())
+    return algorithm, cost
+
+
+def _needs_rehash(password_hash: str) -> bool:
+    # Only ever strengthen a hash: same algorithm, lower cost than
+    # configured. A hash from another algorithm is left alone, since e.g.
+    # scrypt -> pbkdf2 would be a downgrade. Werkzeug normalizes the method
+    # it writes ("scrypt" -> "scrypt:32768:8:1"), so compare against the
+    # prefix of a hash actually produced with the configured method.
+    method = current_app.config["PASSWORD_HASH_METHOD"]
+    algorithm, cost = _hash_algorithm_and_cost(password_hash.split("$", 1)[0])
+    want_algorithm, want_cost = _hash_algorithm_and_cost(_dummy_password_hash(method).split("$", 1)[0])
+    return (
+        algorithm == want_algorithm
+        and len(cost) == len(want_cost)
+        and cost != want_cost
+        and all(have <= want for have, want in zip(cost, want_cost))
+    )
+
+
+@lru_cache(maxsize=None)
+def _dummy_password_hash(method: str) -> str:
+    # Verified against when there is no user, so a failed login costs the
+    # same hash work whether or not the email exists, as long as stored
+    # hashes use the configured method (see PASSWORD_HASH_METHOD)
+    return generate_password_hash("garuda360-dummy-password", method=method, salt_length=16)
+
+
+@main_bp.record_once
+def _warm_dummy_password_hash(state):
+    # Compute at startup so the first failed login isn't slower than the rest
+    _dummy_password_hash(state.app.config["PASSWORD_HASH_METHOD"])
+
+
+@main_bp.before_request
+def _stamp_request_time():
+    # One clock read per request, shared by every timestamp written during
+    # it (consistent audit times, no per-row utcnow() calls)
+    g.utcnow = datetime.utcnow()
+
+
+def _cache_is_process_local() -> bool:
+    # SimpleCache / NullCache live inside each worker process: a write
+    # handled by one gunicorn worker can't bump the data version the others
+    # see, so their cached pages would go stale. Only cache views when the
+    # backend is shared (e.g. CACHE_TYPE=RedisCache).
+    return isinstance(cache.cache, (SimpleCache, NullCache))
+
+
+def _data_version():
+    # A fresh random token, never a counter: if the key is evicted or two
+    # writers race, old "view:...:<version>:..." entries can't come back
+    version = cache.get("data_version")
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set("data_version", version, timeout=0)
+    return version
+
+
+def invalidate_cached_views():
+    """Call after any write that can change a cached page."""
+    cache.set("data_version", uuid.uuid4().hex, timeout=0)
+
+
+def _user_view_cache_key():
+    # Per user (the navbar shows their name) and per data version, so one
+    # bump after a write invalidates every cached page at once.
+    return f"view:{current_user.id}:{_data_version()}:{request.path}"
+
+
+def _authorized_group_ids():
+    """
+    Group ids the current user belongs to, looked up once per request
+    and cached on flask.g.
+    """
+    if "_auth_gids" not in g:
+        g._auth_gids = [
+            row[0]
+            for row in db.session.query(OwnerGroupUser.group_id)
+            .filter_by(user_id=current_user.id)
+            .all()
+        ]
+    return g._auth_gids
+
 
 def vehicle_query_for_current_user():
     # Admin can see all vehicles
-    if current_user.is_authenticated and current_user.email == "admin@garuda360.com":
+    if current_user.is_authenticated and getattr(current_user, "is_admin", False):
         return Vehicle.query
 
     # Normal owner: only vehicles in their groups
-    return (
-        Vehicle.query
-        .join(OwnerGroup, Vehicle.group_id == OwnerGroup.id)
-        .join(OwnerGroupUser, OwnerGroup.id == OwnerGroupUser.group_id)
-        .filter(OwnerGroupUser.user_id == current_user.id)
-    )
+    return Vehicle.query.filter(Vehicle.group_id.in_(_authorized_group_ids()))
 
 
 def get_vehicle_for_current_user(vehicle_id: int) -> Vehicle:
@@ -46,36 +205,19 @@ def get_vehicle_for_current_user(vehicle_id: int) -> Vehicle:
         .first_or_404()
     )
 
-def predict_next_service(vehicle, service_type: str, km_interval: int, months_interval: int):
+def build_service_prediction(vehicle, service_type: str, km_interval: int, months_interval: int,
+                             last_date=None, last_odo=None):
     """
-    Predict the next service for a given vehicle and service type
+    Turn an already-fetched last service (date + odometer) into a prediction
     using simple rules:
-      - look at last service_event of this type
-      - if found, next date = last_date + months_interval
-                    next odo = last_odo + km_interval
-      - if not found, base it on today + current odometer
+      - next date = last_date + months_interval
+      - next odo  = last_odo + km_interval
+      - no history → start from today + the vehicle's current odometer
     """
-    from datetime import date
-
-    # Find last service for this type
-    last_event = (
-        ServiceEvent.query
-        .filter_by(vehicle_id=vehicle.id, service_type=service_type)
-        .order_by(ServiceEvent.service_date.desc())
-        .first()
-    )
-
-    if last_event:
-        last_date = last_event.service_date or date.today()
-        last_odo = last_event.odometer_at_service or vehicle.current_odometer
-    else:
-        # No history → start from current state
-        last_date = date.today()
-        last_odo = vehicle.current_odometer
+    last_date = last_date or date.today()
+    last_odo = last_odo or vehicle.current_odometer
 
     # Approximate months as 30 days each (simple but fine for project)
-    from datetime import timedelta
-
     next_date = last_date + timedelta(days=months_interval * 30)
     next_odo = last_odo + km_interval
 
@@ -88,7 +230,293 @@ def predict_next_service(vehicle, service_type: str, km_interval: int, months_in
     }
 
 
-main_bp = Blueprint("main", __name__)
+def create_vehicle_metrics(vehicle_id: int):
+    """
+    Insert the VehicleMetricsCache row for a vehicle that has none yet,
+    built from its full service + fuel history, and return the stored values.
+
+    Returns None if another request created the row first: its totals are
+    the ones to keep, since this request's snapshot can't see that
+    request's (possibly uncommitted) event.
+    """
+    sql_metrics = text("""
+        WITH service_summary AS (
+            SELECT
+                COUNT(*) AS service_count,
+                COALESCE(SUM(total_cost), 0) AS total_service_expense
+            FROM service_event
+            WHERE vehicle_id = :vid
+        ),
+        fuel_summary AS (
+            SELECT
+                COALESCE(SUM(total_cost), 0) AS total_fuel_cost,
+                COALESCE(SUM(liters), 0) AS total_liters,
+                COUNT(*) AS fuel_count,
+                MIN(odometer) AS min_odo,
+                MAX(odometer) AS max_odo
+            FROM fuel_entry
+            WHERE vehicle_id = :vid
+        )
+        SELECT * FROM service_summary CROSS JOIN fuel_summary
+    """)
+    row = db.session.execute(sql_metrics, {"vid": vehicle_id}).first()
+
+    values = {
+        "vehicle_id": vehicle_id,
+        "service_count": row.service_count,
+        "total_service_expense": float(row.total_service_expense),
+        "total_fuel_cost": float(row.total_fuel_cost),
+        "total_liters": float(row.total_liters),
+        "fuel_count": row.fuel_count,
+        "min_odo": row.min_odo,
+        "max_odo": row.max_odo,
+        "updated_at": g.utcnow,
+    }
+
+    # Plain INSERT in a savepoint, so a primary key collision only undoes
+    # this statement and works the same on every database
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(VehicleMetricsCache).values(**values))
+    except IntegrityError:
+        return None
+    return values
+
+
+def _apply_metrics_update(vehicle_id: int, stmt):
+    # Increment the cached row; if there is none yet, create it from
+    # history (which already includes the new, flushed event). If another
+    # request created it in the meantime, increment that row instead.
+    if db.session.execute(stmt).rowcount == 0 and create_vehicle_metrics(vehicle_id) is None:
+        db.session.execute(stmt)
+
+
+def record_service_metrics(vehicle_id: int, total_cost: float):
+    """Add one service event to the vehicle's cached metrics."""
+    _apply_metrics_update(
+        vehicle_id,
+        update(VehicleMetricsCache)
+        .where(VehicleMetricsCache.vehicle_id == vehicle_id)
+        .values(
+            service_count=VehicleMetricsCache.service_count + 1,
+            total_service_expense=VehicleMetricsCache.total_service_expense + (total_cost or 0),
+            updated_at=g.utcnow,
+        ),
+    )
+
+
+def record_fuel_metrics(vehicle_id: int, liters: float, total_cost: float, odometer: int):
+    """Add one fuel entry to the vehicle's cached metrics."""
+    m = VehicleMetricsCache
+    _apply_metrics_update(
+        vehicle_id,
+        update(m)
+        .where(m.vehicle_id == vehicle_id)
+        .values(
+            total_fuel_cost=m.total_fuel_cost + (total_cost or 0),
+            total_liters=m.total_liters + (liters or 0),
+            fuel_count=m.fuel_count + 1,
+            # Portable LEAST / GREATEST that also handle the first entry (NULL)
+            min_odo=case((or_(m.min_odo.is_(None), m.min_odo > odometer), odometer), else_=m.min_odo),
+            max_odo=case((or_(m.max_odo.is_(None), m.max_odo < odometer), odometer), else_=m.max_odo),
+            updated_at=g.utcnow,
+        ),
+    )
+
+
+def backfill_vehicle_metrics():
+    """
+    Build VehicleMetricsCache rows, in one statement, for every vehicle that
+    doesn't have one yet (e.g. bulk-seeded vehicles).
+    """
+    sql_backfill = text("""
+        INSERT INTO vehicle_metrics_cache (
+            vehicle_id, service_count, total_service_expense,
+            total_fuel_cost, total_liters, fuel_count, min_odo, max_odo, updated_at
+        )
+        SELECT
+            v.id,
+            COALESCE(s.service_count, 0),
+            COALESCE(s.total_expense, 0),
+            COALESCE(f.total_fuel_cost, 0),
+            COALESCE(f.total_liters, 0),
+            COALESCE(f.fuel_count, 0),
+            f.min_odo,
+            f.max_odo,
+            :now
+        FROM vehicle v
+        LEFT JOIN (
+            SELECT vehicle_id, COUNT(*) AS service_count, SUM(total_cost) AS total_expense
+            FROM service_event
+            GROUP BY vehicle_id
+        ) s ON s.vehicle_id = v.id
+        LEFT JOIN (
+            SELECT
+                vehicle_id,
+                SUM(total_cost) AS total_fuel_cost,
+                SUM(liters) AS total_liters,
+                COUNT(*) AS fuel_count,
+                MIN(odometer) AS min_odo,
+                MAX(odometer) AS max_odo
+            FROM fuel_entry
+            GROUP BY vehicle_id
+        ) f ON f.vehicle_id = v.id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM vehicle_metrics_cache m WHERE m.vehicle_id = v.id
+        )
+    """)
+    # A concurrent backfill may insert some of the same rows first; it
+    # covers the same vehicles, so just drop this attempt
+    try:
+        with db.session.begin_nested():
+            db.session.execute(sql_backfill, {"now": g.utcnow})
+    except IntegrityError:
+        pass
+
+
+# Rule-based intervals for the next-service predictions:
+#   Oil Change  -> every 5000 km or 6 months
+#   Brake Pads  -> every 30000 km or 24 months
+#   Wipers      -> every 20000 km or 18 months
+SERVICE_PREDICTION_RULES = [
+    ("Oil Change", 5000, 6),
+    ("Brake Pads", 30000, 24),
+    ("Wipers", 20000, 18),
+]
+
+_METRIC_FIELDS = (
+    "service_count",
+    "total_service_expense",
+    "total_fuel_cost",
+    "total_liters",
+    "min_odo",
+    "max_odo",
+)
+
+
+def _metrics_as_dict(obj):
+    return {field: getattr(obj, field) for field in _METRIC_FIELDS}
+
+
+def load_vehicle_summary(vehicle_id: int) -> dict:
+    """
+    Everything vehicle_detail needs from the DB, in one round-trip:
+      metrics      -> cached service + fuel totals (None if not built yet)
+      last_by_type -> {service_type: (service_date, odometer)} for the
+                      types in SERVICE_PREDICTION_RULES
+    Returns plain dicts/tuples so the result can be cached.
+    """
+    # m             -> pre-aggregated service + fuel totals (VehicleMetricsCache)
+    # last_per_type -> latest service_event for each predicted type
+    # Both are LEFT JOINed onto a single-row anchor, so we always get at
+    # least one row (NULL metrics mean the cache row hasn't been built yet).
+    sql_vehicle_summary = text("""
+        WITH last_per_type AS (
+            SELECT service_type, service_date, odometer_at_service
+            FROM (
+                SELECT
+                    service_type,
+                    service_date,
+                    odometer_at_service,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY service_type
+                        ORDER BY service_date DESC
+                    ) AS rn
+                FROM service_event
+                WHERE vehicle_id = :vid
+                  AND service_type IN :service_types
+            ) ranked
+            WHERE rn = 1
+        )
+        SELECT
+            m.service_count,
+            m.total_service_expense,
+            m.total_fuel_cost,
+            m.total_liters,
+            m.min_odo,
+            m.max_odo,
+            l.service_type,
+            l.service_date,
+            l.odometer_at_service
+        FROM (SELECT CAST(:vid AS INTEGER) AS vehicle_id) anchor
+        LEFT JOIN vehicle_metrics_cache m ON m.vehicle_id = anchor.vehicle_id
+        LEFT JOIN last_per_type l ON 1 = 1
+    """).bindparams(
+        bindparam("service_types", expanding=True),
+    ).columns(service_date=db.Date)
+
+    rows = db.session.execute(
+        sql_vehicle_summary,
+        {"vid": vehicle_id, "service_types": [r[0] for r in SERVICE_PREDICTION_RULES]},
+    ).all()
+
+    return {
+        "metrics": _metrics_as_dict(rows[0]) if rows[0].service_count is not None else None,
+        "last_by_type": {
+            row.service_type: (row.service_date, row.odometer_at_service)
+            for row in rows
+            if row.service_type
+        },
+    }
+
+
+def _vehicle_summary_key(vehicle_id: int, version=None) -> str:
+    # Not per user: vehicle_detail still runs its authorization check
+    # before using a cached summary
+    if version is None:
+        version = _data_version()
+    return f"vehicle_summary:{version}:{vehicle_id}"
+
+
+# Seconds a prefetched summary stays cached
+_PREFETCH_TIMEOUT = 60
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vehicle-prefetch")
+
+
+def prefetch_vehicle_summaries(vehicle_ids):
+    """
+    Fire-and-forget: warm the summary cache for the most recently updated
+    of `vehicle_ids`, the likeliest next click from the vehicle list.
+    """
+    count = current_app.config["VEHICLE_PREFETCH_COUNT"]
+    # A process-local cache only helps if the next click lands on this
+    # same worker, so don't spend a query on it
+    if not count or not vehicle_ids or _cache_is_process_local():
+        return
+
+    # At most one job per data version and page while its summaries are
+    # still cached: cache.add() only succeeds for the first request, so
+    # repeat hits don't pile jobs onto the executor's unbounded queue.
+    # (Tuples of ints hash the same in every process.)
+    version = _data_version()
+    if not cache.add(f"vehicle_prefetch:{version}:{hash(tuple(vehicle_ids))}", True, timeout=_PREFETCH_TIMEOUT):
+        return
+    _prefetch_executor.submit(
+        _prefetch_vehicle_summaries,
+        current_app._get_current_object(),
+        list(vehicle_ids),
+        count,
+        version,
+    )
+
+
+def _prefetch_vehicle_summaries(app, vehicle_ids, count, version):
+    with app.app_context():
+        try:
+            top_ids = db.session.execute(
+                select(VehicleMetricsCache.vehicle_id)
+                .where(VehicleMetricsCache.vehicle_id.in_(vehicle_ids))
+                .order_by(VehicleMetricsCache.updated_at.desc())
+                .limit(count)
+            ).scalars().all()
+
+            for vehicle_id in top_ids:
+                key = _vehicle_summary_key(vehicle_id, version)
+                if cache.get(key) is None:
+                    cache.set(key, load_vehicle_summary(vehicle_id), timeout=_PREFETCH_TIMEOUT)
+        except Exception:
+            app.logger.exception("Vehicle summary prefetch failed")
 
 
 @main_bp.route("/")
@@ -99,16 +527,25 @@ def index():
 @main_bp.route("/create-admin-user")
 def create_admin_user():
     email = "admin@garuda360.com"
-    if User.query.filter_by(email=email).first():
+
+    # Cheap read first so repeat hits don't pay for hashing the password
+    if db.session.execute(USER_BY_EMAIL_STMT, {"email": email}).scalar_one_or_none():
         return "<p>Admin already exists.</p>"
 
-    admin = User(
-        email=email,
-        name="Admin",
-        password_hash=generate_password_hash("Admin123!"),
-    )
-    db.session.add(admin)
+    # email is unique: a concurrent request that got past the check above
+    # makes this INSERT fail instead of creating a duplicate
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(User).values(
+                email=email,
+                name="Admin",
+                password_hash=hash_password("Admin123!"),
+                is_admin=True,
+            ))
+    except IntegrityError:
+        return "<p>Admin already exists.</p>"
     db.session.commit()
+
     return "<p>Admin user created. Email: admin@garuda360.com, Password: Admin123!</p>"
 
 
@@ -127,33 +564,69 @@ def init_db():
     return "<p>Database tables created successfully for Garuda360.</p>"
 @main_bp.route("/create-sample")
 def create_sample():
-    # Check if a group already exists
-    group = OwnerGroup.query.first()
-    if not group:
-        group = OwnerGroup(group_name="My Family Garage")
-        db.session.add(group)
-        db.session.commit()
+    # Each guard is a single INSERT ... SELECT ... WHERE NOT EXISTS, saving
+    # the separate SELECT round-trip. This is not atomic: under READ
+    # COMMITTED two concurrent hits can both see no rows and both insert
+    # (there is no unique key to stop them). Fine for a dev-only route.
+
+    # Create a group if none exists yet
+    db.session.execute(
+        insert(OwnerGroup).from_select(
+            ["group_name"],
+            select(literal("My Family Garage")).where(~select(OwnerGroup.id).exists()),
+        )
+    )
 
-    # Check if any vehicle exists; if not, create one
-    if not Vehicle.query.first():
-        car = Vehicle(
-            group_id=group.id,
-            brand="Toyota",
-            model="Camry",
-            year=2018,
-            registration_no="TEST-1234",
-            current_odometer=45000
+    # Create a vehicle (in the first group) if none exists yet
+    result = db.session.execute(
+        insert(Vehicle).from_select(
+            ["group_id", "brand", "model", "year", "registration_no", "current_odometer"],
+            select(
+                select(func.min(OwnerGroup.id)).scalar_subquery(),
+                literal("Toyota"),
+                literal("Camry"),
+                literal(2018),
+                literal("TEST-1234"),
+                literal(45000),
+            ).where(~select(Vehicle.id).exists()),
         )
-        db.session.add(car)
-        db.session.commit()
+    )
+    db.session.commit()
+
+    if result.rowcount:
+        invalidate_cached_views()
         return "<p>Sample group and vehicle created successfully.</p>"
 
     return "<p>Sample data already exists. No new vehicle created.</p>"
 @main_bp.route("/vehicles")
 @login_required
 def list_vehicles():
-    vehicles = vehicle_query_for_current_user().all()
-    return render_template("vehicles.html", vehicles=vehicles)
+    # The list template only renders these columns, so fetch plain Row
+    # tuples instead of full Vehicle objects (no identity map, and no
+    # relationship to lazy-load by accident).
+    limit = _page_size()
+    query = vehicle_query_for_current_user().with_entities(
+        Vehicle.id,
+        Vehicle.brand,
+        Vehicle.model,
+        Vehicle.year,
+        Vehicle.registration_no,
+        Vehicle.current_odometer,
+    )
+
+    # Keyset pagination on id: ?cursor=<last id shown>
+    cursor = request.args.get("cursor", type=int)
+    if cursor is not None:
+        query = query.filter(Vehicle.id > cursor)
+
+    vehicles = query.order_by(Vehicle.id).limit(limit + 1).all()
+    next_url = None
+    if len(vehicles) > limit:
+        vehicles = vehicles[:limit]
+        next_url = url_for("main.list_vehicles", cursor=vehicles[-1].id, limit=request.args.get("limit"))
+
+    prefetch_vehicle_summaries([v.id for v in vehicles])
+    return render_template("vehicles.html", vehicles=vehicles, next_url=next_url)
 @main_bp.route("/vehicles/<int:vehicle_id>/edit", methods=["GET", "POST"])
 @login_required
 def edit_vehicle(vehicle_id):
@@ -167,62 +640,49 @@ def edit_vehicle(vehicle_id):
         vehicle.current_odometer = request.form["current_odometer"]
 
         db.session.commit()
+        invalidate_cached_views()
         return redirect(url_for("main.list_vehicles"))
 
     # GET request → show form
     return render_template("edit_vehicle.html", vehicle=vehicle)
 @main_bp.route("/vehicles/<int:vehicle_id>")
 @login_required
+@cache.cached(timeout=300, key_prefix=_user_view_cache_key, unless=_cache_is_process_local)
 def vehicle_detail(vehicle_id):
     vehicle = get_vehicle_for_current_user(vehicle_id)
 
-    # 1) Service summary: count + total expense
-    sql_service_summary = text("""
-        SELECT
-            COUNT(*) AS service_count,
-            COALESCE(SUM(total_cost), 0) AS total_expense
-        FROM service_event
-        WHERE vehicle_id = :vid
-    """)
-    svc = db.session.execute(sql_service_summary, {"vid": vehicle.id}).first()
-    service_count = svc.service_count or 0
-    total_service_expense = float(svc.total_expense or 0)
+    # list_vehicles may already have prefetched this in the background
+    summary = cache.get(_vehicle_summary_key(vehicle.id)) or load_vehicle_summary(vehicle.id)
 
-    # 2) Fuel summary: total fuel cost + total liters + approx mileage
-    sql_fuel_summary = text("""
-        SELECT
-            COALESCE(SUM(total_cost), 0) AS total_fuel_cost,
-            COALESCE(SUM(liters), 0) AS total_liters,
-            CASE
-                WHEN SUM(liters) > 0 THEN
-                    (MAX(odometer) - MIN(odometer)) * 1.0 / SUM(liters)
-                ELSE NULL
-            END AS km_per_liter
-        FROM fuel_entry
-        WHERE vehicle_id = :vid
-    """)
-    fuel = db.session.execute(sql_fuel_summary, {"vid": vehicle.id}).first()
-    total_fuel_cost = float(fuel.total_fuel_cost or 0)
-    total_liters = float(fuel.total_liters or 0)
-    km_per_liter = fuel.km_per_liter  # can be None if no fuel data
-    # 3) Predict next service for key items (rule-based)
-    # You can adjust these intervals as needed:
-    #   Oil Change  -> every 5000 km or 6 months
-    #   Brake Pads  -> every 30000 km or 24 months
-    #   Wipers      -> every 20000 km or 18 months
-
-    predictions = []
-
-    rules = [
-        ("Oil Change", 5000, 6),
-        ("Brake Pads", 30000, 24),
-        ("Wipers", 20000, 18),
+    metrics = summary["metrics"]
+    if metrics is None:
+        # First view of a vehicle with no cached metrics (e.g. seeded data)
+        metrics = create_vehicle_metrics(vehicle.id)
+        db.session.commit()
+        if metrics is None:
+            metrics = _metrics_as_dict(db.session.get(VehicleMetricsCache, vehicle.id))
+
+    service_count = metrics["service_count"] or 0
+    total_service_expense = float(metrics["total_service_expense"] or 0)
+    total_fuel_cost = float(metrics["total_fuel_cost"] or 0)
+    total_liters = float(metrics["total_liters"] or 0)
+    if total_liters > 0 and metrics["max_odo"] is not None:
+        km_per_liter = (metrics["max_odo"] - metrics["min_odo"]) * 1.0 / total_liters
+    else:
+        km_per_liter = None  # no fuel data
+
+    # Predictions are pure date/int arithmetic over the summary fetched above
+    today = date.today()
+    no_history = (today, vehicle.current_odometer)
+    last_by_type = summary["last_by_type"]
+    predictions = [
+        build_service_prediction(
+            vehicle, service_type, km_int, months_int,
+            *last_by_type.get(service_type, no_history),
+        )
+        for service_type, km_int, months_int in SERVICE_PREDICTION_RULES
     ]
 
-    for service_type, km_int, months_int in rules:
-        pred = predict_next_service(vehicle, service_type, km_int, months_int)
-        predictions.append(pred)
-
     return render_template(
         "vehicle_detail.html",
         vehicle=vehicle,
@@ -247,13 +707,18 @@ def seed_sample_data():
     - ~15 odometer logs per vehicle
     """
 
-    # Check if we already seeded
-    if Vehicle.query.count() >= 5:
+    # Check if we already seeded: only need to know whether a 5th row
+    # exists, so let the DB stop there instead of counting the table
+    already_seeded = db.session.execute(
+        select(Vehicle.id).offset(4).limit(1)
+    ).first() is not None
+    if already_seeded:
         return "<p>Database already has enough vehicles. Skipping seeding.</p>"
 
     # --- 1. Create owner groups ---
-    group1 = OwnerGroup(group_name="Family Garage A")
-    group2 = OwnerGroup(group_name="Family Garage B")
+    now = g.utcnow
+    group1 = OwnerGroup(group_name="Family Garage A", created_at=now)
+    group2 = OwnerGroup(group_name="Family Garage B", created_at=now)
 
     db.session.add_all([group1, group2])
     db.session.commit()
@@ -282,98 +747,130 @@ def seed_sample_data():
 
     db.session.commit()
 
-    # --- 3. Helper to generate random dates ---
-    def random_past_date(days_back=365):
-        return datetime.utcnow().date() - timedelta(days=random.randint(0, days_back))
+    # --- 3. Pre-materialize timestamps and dates ---
+    # One date per possible day offset (off the request's single clock
+    # read); rows then just sample from these lists instead of calling
+    # utcnow()/randint() per row.
+    today = now.date()
+    past_dates_2y = [today - timedelta(days=d) for d in range(731)]
+    past_dates_1y = past_dates_2y[:366]
+
+    service_types = ["Oil Change", "Brake Pads", "Tire Rotation", "General Service"]
+    expense_categories = ["Insurance", "Tax", "Parking", "Toll", "Car Wash"]
+    issue_severity = ["Low", "Medium", "High"]
+    issue_categories = ["Engine", "Brakes", "Electrical", "Body", "Suspension"]
+
+    # --- 4. For each vehicle, build service, fuel, expense, issues, odometer rows ---
+    # Plain dicts are inserted in bulk below (one executemany per table)
+    # instead of adding hundreds of ORM objects to the session. Random
+    # picks are drawn in one random.choices(k=...) call per column.
+    service_rows = []
+    fuel_rows = []
+    expense_rows = []
+    issue_rows = []
+    odometer_rows = []
 
-    # --- 4. For each vehicle, create service, fuel, expense, issues, odometer logs ---
     for v in vehicles:
         base_odometer = v.current_odometer - 20000  # assume 20k km history
 
-        # 4a. Service events (e.g., oil change, brakes)
-        service_types = ["Oil Change", "Brake Pads", "Tire Rotation", "General Service"]
-        for i in range(10):  # 10 service events
-            odo_at_service = base_odometer + i * 2000
-            s = ServiceEvent(
-                vehicle_id=v.id,
-                service_date=random_past_date(730),
-                odometer_at_service=odo_at_service,
-                service_type=random.choice(service_types),
-                description="Routine maintenance performed.",
-                labor_cost=round(random.uniform(50, 150), 2),
-                total_cost=round(random.uniform(100, 400), 2),
-            )
-            db.session.add(s)
-
-        # 4b. Fuel entries
-        for i in range(20):  # 20 fuel fills
-            odo_at_fuel = base_odometer + i * 800
+        # 4a. Service events (e.g., oil change, brakes) - 10 per vehicle
+        for i, (svc_date, svc_type) in enumerate(zip(
+            random.choices(past_dates_2y, k=10),
+            random.choices(service_types, k=10),
+        )):
+            service_rows.append({
+                "vehicle_id": v.id,
+                "service_date": svc_date,
+                "odometer_at_service": base_odometer + i * 2000,
+                "service_type": svc_type,
+                "description": "Routine maintenance performed.",
+                "labor_cost": round(random.uniform(50, 150), 2),
+                "total_cost": round(random.uniform(100, 400), 2),
+            })
+
+        # 4b. Fuel entries - 20 fills per vehicle
+        for i, (fuel_date, fuel_type, station) in enumerate(zip(
+            random.choices(past_dates_1y, k=20),
+            random.choices(["Petrol", "Diesel"], k=20),
+            random.choices(["Shell", "BP", "Costco", "RandomGas"], k=20),
+        )):
             liters = round(random.uniform(30, 50), 1)
             price_per_liter = round(random.uniform(1.0, 1.5), 2)
-            f = FuelEntry(
-                vehicle_id=v.id,
-                date=random_past_date(365),
-                odometer=odo_at_fuel,
-                liters=liters,
-                price_per_liter=price_per_liter,
-                total_cost=round(liters * price_per_liter, 2),
-                fuel_type=random.choice(["Petrol", "Diesel"]),
-                station_name=random.choice(["Shell", "BP", "Costco", "RandomGas"]),
-            )
-            db.session.add(f)
+            fuel_rows.append({
+                "vehicle_id": v.id,
+                "date": fuel_date,
+                "odometer": base_odometer + i * 800,
+                "liters": liters,
+                "price_per_liter": price_per_liter,
+                "total_cost": round(liters * price_per_liter, 2),
+                "fuel_type": fuel_type,
+                "station_name": station,
+            })
 
         # 4c. Expenses (insurance, tax, etc.)
-        expense_categories = ["Insurance", "Tax", "Parking", "Toll", "Car Wash"]
-        for i in range(5):
-            e = Expense(
-                vehicle_id=v.id,
-                date=random_past_date(365),
-                category=random.choice(expense_categories),
-                amount=round(random.uniform(20, 300), 2),
-                description="Recurring vehicle expense.",
-            )
-            db.session.add(e)
+        for exp_date, category in zip(
+            random.choices(past_dates_1y, k=5),
+            random.choices(expense_categories, k=5),
+        ):
+            expense_rows.append({
+                "vehicle_id": v.id,
+                "date": exp_date,
+                "category": category,
+                "amount": round(random.uniform(20, 300), 2),
+                "description": "Recurring vehicle expense.",
+            })
 
         # 4d. Issues
-        issue_severity = ["Low", "Medium", "High"]
-        issue_categories = ["Engine", "Brakes", "Electrical", "Body", "Suspension"]
-        for i in range(5):
-            issue = IssueLog(
-                vehicle_id=v.id,
-                date_reported=random_past_date(365),
-                description="Reported issue for diagnostics.",
-                severity=random.choice(issue_severity),
-                category=random.choice(issue_categories),
-                status=random.choice(["open", "resolved", "in-progress"]),
-            )
-            db.session.add(issue)
+        for reported, severity, category, status in zip(
+            random.choices(past_dates_1y, k=5),
+            random.choices(issue_severity, k=5),
+            random.choices(issue_categories, k=5),
+            random.choices(["open", "resolved", "in-progress"], k=5),
+        ):
+            issue_rows.append({
+                "vehicle_id": v.id,
+                "date_reported": reported,
+                "description": "Reported issue for diagnostics.",
+                "severity": severity,
+                "category": category,
+                "status": status,
+            })
 
         # 4e. Odometer logs
-        for i in range(15):
-            odo_val = base_odometer + i * 1200
-            odolog = OdometerLog(
-                vehicle_id=v.id,
-                reading=odo_val,
-                log_date=datetime.utcnow() - timedelta(days=i * 15),
-                source=random.choice(["manual", "fuel", "service"]),
-            )
-            db.session.add(odolog)
+        for i, source in enumerate(random.choices(["manual", "fuel", "service"], k=15)):
+            odometer_rows.append({
+                "vehicle_id": v.id,
+                "reading": base_odometer + i * 1200,
+                "log_date": now - timedelta(days=i * 15),
+                "source": source,
+            })
+
+    # --- 5. Bulk insert: one batched statement per table ---
+    db.session.execute(insert(ServiceEvent), service_rows)
+    db.session.execute(insert(FuelEntry), fuel_rows)
+    db.session.execute(insert(Expense), expense_rows)
+    db.session.execute(insert(IssueLog), issue_rows)
+    db.session.execute(insert(OdometerLog), odometer_rows)
 
     db.session.commit()
+    invalidate_cached_views()
 
     return "<p>Sample data seeded successfully: multiple vehicles, service events, fuel logs, expenses, issues, and odometer logs.</p>"
 @main_bp.route("/vehicles/new", methods=["GET", "POST"])
 @login_required
 def add_vehicle():
-    # Get or create group for this user
-    link = OwnerGroupUser.query.filter_by(user_id=current_user.id).first()
+    # Get or create group for this user. A new group + link is only
+    # flushed here; it is committed together with the vehicle on POST.
+    link = db.session.execute(LINK_BY_USER_STMT, {"uid": current_user.id}).scalar_one_or_none()
+    created_link = False
     if not link:
-        group = OwnerGroup(group_name=f"{current_user.name}'s Garage")
+        group = OwnerGroup(group_name=f"{current_user.name}'s Garage", created_at=g.utcnow)
         db.session.add(group)
-        db.session.commit()
-        link = OwnerGroupUser(group_id=group.id, user_id=current_user.id)
+        db.session.flush()
+        link = OwnerGroupUser(group_id=group.id, user_id=current_user.id, added_at=g.utcnow)
         db.session.add(link)
-        db.session.commit()
+        g.pop("_auth_gids", None)  # membership changed
+        created_link = True
 
     group_id = link.group_id
 
@@ -391,8 +888,13 @@ def add_vehicle():
         )
         db.session.add(vehicle)
         db.session.commit()
+        invalidate_cached_views()
         return redirect(url_for("main.list_vehicles"))
 
+    if created_link:
+        db.session.commit()
+        invalidate_cached_views()
+
     return render_template("add_vehicle.html")
 
 
@@ -401,13 +903,22 @@ def add_vehicle():
 def list_services(vehicle_id):
     vehicle = get_vehicle_for_current_user(vehicle_id)
 
-    services = (
+    services, next_cursor = keyset_page_by_date(
         ServiceEvent.query
-        .filter_by(vehicle_id=vehicle.id)
-        .order_by(ServiceEvent.service_date.desc())
-        .all()
+        .options(raiseload("*"))
+        .filter_by(vehicle_id=vehicle.id),
+        ServiceEvent.service_date,
+        ServiceEvent.id,
     )
-    return render_template("services.html", vehicle=vehicle, services=services)
+    next_url = None
+    if next_cursor:
+        next_url = url_for(
+            "main.list_services",
+            vehicle_id=vehicle.id,
+            cursor=next_cursor,
+            limit=request.args.get("limit"),
+        )
+    return render_template("services.html", vehicle=vehicle, services=services, next_url=next_url)
 
 
 @main_bp.route("/vehicles/<int:vehicle_id>/services/new", methods=["GET", "POST"])
@@ -429,7 +940,9 @@ def add_service(vehicle_id):
             total_cost=float(request.form.get("total_cost") or 0),
         )
         db.session.add(s)
+        record_service_metrics(vehicle.id, s.total_cost)
         db.session.commit()
+        invalidate_cached_views()
         return redirect(url_for("main.list_services", vehicle_id=vehicle.id))
 
     return render_template("add_service.html", vehicle=vehicle)
@@ -438,13 +951,22 @@ def add_service(vehicle_id):
 def list_fuel(vehicle_id):
     vehicle = get_vehicle_for_current_user(vehicle_id)
 
-    entries = (
+    entries, next_cursor = keyset_page_by_date(
         FuelEntry.query
-        .filter_by(vehicle_id=vehicle.id)
-        .order_by(FuelEntry.date.desc())
-        .all()
+        .options(raiseload("*"))
+        .filter_by(vehicle_id=vehicle.id),
+        FuelEntry.date,
+        FuelEntry.id,
     )
-    return render_template("fuel.html", vehicle=vehicle, entries=entries)
+    next_url = None
+    if next_cursor:
+        next_url = url_for(
+            "main.list_fuel",
+            vehicle_id=vehicle.id,
+            cursor=next_cursor,
+            limit=request.args.get("limit"),
+        )
+    return render_template("fuel.html", vehicle=vehicle, entries=entries, next_url=next_url)
 
 
 @main_bp.route("/vehicles/<int:vehicle_id>/fuel/new", methods=["GET", "POST"])
@@ -476,7 +998,9 @@ def add_fuel(vehicle_id):
             station_name=request.form.get("station_name"),
         )
         db.session.add(entry)
+        record_fuel_metrics(vehicle.id, liters, total_cost, odometer)
         db.session.commit()
+        invalidate_cached_views()
         return redirect(url_for("main.list_fuel", vehicle_id=vehicle.id))
 
     return render_template("add_fuel.html", vehicle=vehicle)
@@ -492,24 +1016,24 @@ def register():
         email = request.form["email"].strip().lower()
         password = request.form["password"]
 
-        if User.query.filter_by(email=email).first():
+        if db.session.execute(USER_BY_EMAIL_STMT, {"email": email}).scalar_one_or_none():
             error = "Email is already registered."
             return render_template("register.html", error=error)
 
         user = User(
             email=email,
             name=name,
-            password_hash=generate_password_hash(password),
+            password_hash=hash_password(password),
         )
         db.session.add(user)
-        db.session.commit()
 
-        # Create an owner group for this user
-        group = OwnerGroup(group_name=f"{name}'s Garage")
+        # Create an owner group for this user; flush() assigns the ids we
+        # need for the link without ending the transaction
+        group = OwnerGroup(group_name=f"{name}'s Garage", created_at=g.utcnow)
         db.session.add(group)
-        db.session.commit()
+        db.session.flush()
 
-        link = OwnerGroupUser(group_id=group.id, user_id=user.id)
+        link = OwnerGroupUser(group_id=group.id, user_id=user.id, added_at=g.utcnow)
         db.session.add(link)
         db.session.commit()
 
@@ -528,8 +1052,19 @@ def login():
         email = request.form["email"].strip().lower()
         password = request.form["password"]
 
-        user = User.query.filter_by(email=email).first()
-        if user and check_password_hash(user.password_hash, password):
+        # Malformed emails can't match a user: skip the DB round-trip
+        user = None
+        if _EMAIL_RE.match(email):
+            user = db.session.execute(USER_BY_EMAIL_STMT, {"email": email}).scalar_one_or_none()
+
+        if user is None:
+            check_password_hash(_dummy_password_hash(current_app.config["PASSWORD_HASH_METHOD"]), password)
+            error = "Invalid email or password."
+        elif check_password_hash(user.password_hash, password):
+            if _needs_rehash(user.password_hash):
+                # Rolling upgrade to the configured cost (same algorithm only)
+                user.password_hash = hash_password(password)
+                db.session.commit()
             login_user(user)
             return redirect(url_for("main.list_vehicles"))
         else:
@@ -538,54 +1073,63 @@ def login():
     return render_template("login.html", error=error)
 @main_bp.route("/sql-demo")
 @login_required
+@cache.cached(timeout=60, key_prefix=_user_view_cache_key, unless=_cache_is_process_local)
 def sql_demo():
     """
     Demo page that runs raw SQL queries and shows results.
-    """
 
-    # 1) List all vehicles (raw SQL SELECT)
-    sql_vehicles = text("""
-        SELECT id, brand, model, year, current_odometer
-        FROM vehicle
-        ORDER BY brand, model
-    """)
-    result_vehicles = db.session.execute(sql_vehicles).fetchall()
-
-    # 2) Service count per vehicle (raw SQL GROUP BY)
-    sql_service_counts = text("""
-        SELECT vehicle_id, COUNT(*) AS service_count
-        FROM service_event
-        GROUP BY vehicle_id
-        ORDER BY service_count DESC
-    """)
-    result_services = db.session.execute(sql_service_counts).fetchall()
-    # 3) Total service expenses per vehicle (SUM)
-    sql_total_expenses = text("""
-        SELECT vehicle_id, SUM(total_cost) AS total_expense
-        FROM service_event
-        GROUP BY vehicle_id
-        ORDER BY total_expense DESC
-    """)
-    result_expenses = db.session.execute(sql_total_expenses).fetchall()
-    # 4) Total fuel cost per vehicle (SUM)
-    sql_total_fuel_cost = text("""
-        SELECT vehicle_id, SUM(total_cost) AS total_fuel_cost
-        FROM fuel_entry
-        GROUP BY vehicle_id
-        ORDER BY total_fuel_cost DESC
-    """)
-    result_fuel_cost = db.session.execute(sql_total_fuel_cost).fetchall()
-    # 5) Approximate average mileage per vehicle (km per liter)
-    sql_mileage = text("""
+    All five panels come from one query over vehicle + the pre-aggregated
+    vehicle_metrics_cache (kept current by add_service / add_fuel), rather
+    than five GROUP BY scans of service_event and fuel_entry.
+    """
+    sql_dashboard_stats = text("""
         SELECT
-            vehicle_id,
-            (MAX(odometer) - MIN(odometer)) * 1.0 / NULLIF(SUM(liters), 0) AS km_per_liter
-        FROM fuel_entry
-        GROUP BY vehicle_id
-        HAVING COUNT(*) > 1
-        ORDER BY km_per_liter DESC
+            v.id,
+            v.id AS vehicle_id,
+            v.brand,
+            v.model,
+            v.year,
+            v.current_odometer,
+            m.service_count,
+            m.total_service_expense AS total_expense,
+            m.total_fuel_cost,
+            m.fuel_count,
+            (m.max_odo - m.min_odo) * 1.0 / NULLIF(m.total_liters, 0) AS km_per_liter
+        FROM vehicle v
+        LEFT JOIN vehicle_metrics_cache m ON m.vehicle_id = v.id
+        ORDER BY v.brand, v.model
     """)
-    result_mileage = db.session.execute(sql_mileage).fetchall()
+    stats = db.session.execute(sql_dashboard_stats).fetchall()
+
+    if any(row.service_count is None for row in stats):
+        # Some vehicles have no cached metrics yet → build them all at once
+        backfill_vehicle_metrics()
+        db.session.commit()
+        stats = db.session.execute(sql_dashboard_stats).fetchall()
+
+    # 1) List all vehicles
+    result_vehicles = stats
+
+    # 2) Service count per vehicle (vehicles with service history only)
+    result_services = sorted(
+        (row for row in stats if row.service_count),
+        key=lambda row: row.service_count,
+        reverse=True,
+    )
+    # 3) Total service expenses per vehicle
+    result_expenses = sorted(result_services, key=lambda row: row.total_expense, reverse=True)
+    # 4) Total fuel cost per vehicle (vehicles with fuel entries only)
+    result_fuel_cost = sorted(
+        (row for row in stats if row.fuel_count),
+        key=lambda row: row.total_fuel_cost,
+        reverse=True,
+    )
+    # 5) Approximate average mileage per vehicle (needs 2+ fill-ups)
+    result_mileage = sorted(
+        (row for row in stats if row.fuel_count > 1),
+        key=lambda row: (row.km_per_liter is not None, row.km_per_liter or 0),
+        reverse=True,
+    )
 
     return render_template(
         "sql_demo.html",
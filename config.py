@@ -12,3 +12,27 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = True
 
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        # Rows per batch when executemany INSERTs are sent as multi-VALUES
+        "insertmanyvalues_page_size": 1000,
+        # Compiled-statement cache entries kept per engine
+        "query_cache_size": 1200,
+    }
+
+    # Cached views are only served from a backend shared by all workers
+    # (e.g. RedisCache + CACHE_REDIS_URL). The default SimpleCache is per
+    # process, so with it vehicle_detail / sql_demo are rendered every time.
+    CACHE_TYPE = os.environ.get("CACHE_TYPE", "SimpleCache")
+    CACHE_DEFAULT_TIMEOUT = 300
+
+    # Werkzeug hash method for new passwords. On a user's next successful
+    # login, an existing hash is rehashed only if it uses the same algorithm
+    # with a lower cost; hashes from another algorithm are kept as they are.
+    # Logins for unknown emails are checked against a dummy hash of this
+    # method, so keep it on the algorithm/cost the stored hashes use
+    # (Werkzeug's default, scrypt:32768:8:1) or those logins time differently.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+
+    # Vehicle summaries prefetched in the background after the vehicle list
+    # renders (most recently updated first); 0 disables prefetching
+    VEHICLE_PREFETCH_COUNT = 5